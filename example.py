@@ -1,11 +1,11 @@
 from openmath.openmath import OMObject, OMInteger
 from openmath.encoder import encode_xml
 from openmath.decoder import decode_xml
+from openmath.xml import openmath_ns
 
 from lxml import etree
 
-with open("tests/example.om") as f:
-    xml = etree.fromstring(str(f.read()))
+xml = etree.parse("tests/example.om").getroot()
 
 # try to decode the xml
 node = decode_xml(xml)
@@ -18,4 +18,12 @@ print(decode_xml(encode_xml(node)) == node)
 
 
 obj = OMObject(OMInteger(42))
-print(etree.tostring(encode_xml(obj)))
\ No newline at end of file
+print(etree.tostring(encode_xml(obj)))
+
+# for large files, decode the OpenMath objects one at a time while parsing,
+# and free each of them once it has been decoded
+for _, elem in etree.iterparse("tests/example.om", tag="{%s}OMOBJ" % openmath_ns):
+    print(decode_xml(elem) == node)
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
@@ -10,11 +10,12 @@ if no conversion is known.
 The class ``Converter`` implements no conversion by default. The class
 ``BasicPythonConverter`` implements conversions in both directions for
 basic Python types. For convenience, a default instance
-``DefaultConverter`` of the latter is provided.
+``DefaultConverter`` of the latter is provided; it is created the first
+time it is accessed.
 
 Examples::
 
-    sage: from openmath.convert import to_openmath, to_python, DefaultConverter
+    >>> from openmath.convert import to_openmath, to_python, DefaultConverter
 
     >>> o = DefaultConverter.to_openmath(1); o
     OMInteger(integer=1, id=None)
@@ -77,22 +78,66 @@ objects to Python:
 
 """
 
-import six
-from inspect import isclass
+import threading
+from functools import lru_cache
+from math import isinf, isnan
+from operator import attrgetter, neg
 from . import openmath as om
 
+# marks OM classes whose children are converted and applied by to_python
+_APPLY = object()
+
+class _PendingApply(object):
+    """ Stack entry of to_python: apply a converted value to its n arguments """
+    __slots__ = ('n',)
+
+    def __init__(self, n):
+        self.n = n
+
+@lru_cache(maxsize=128)
+def _oms(name, cd, cdbase):
+    """ Return a shared OpenMath symbol, as used in converted objects """
+    return om.OMSymbol(name=name, cd=cd, cdbase=cdbase)
+
+# shared OMInteger objects for small integers, filled on demand by _omint
+_small_omint = {}
+
+def _omint(i):
+    """ Return an OpenMath integer, shared for integers in [-5, 256] """
+    if -5 <= i <= 256:
+        o = _small_omint.get(i)
+        if o is None:
+            o = _small_omint[i] = om.OMInteger(i)
+        return o
+    return om.OMInteger(i)
+
 class Converter(object):
     """
     A class implementing conversions between native Python and OpenMath objects
     """
+    __slots__ = ('_conv_to_om', '_conv_by_class', '_omclass_to_py',
+                 '_to_python_by_class', '_oms_to_py', '_oms_cache',
+                 '__weakref__')
+
+    # maximum number of symbol lookups remembered by _lookup_to_python
+    _oms_cache_size = 1024
 
     def __init__(self):
-        # A list of converters from Python types to OM
+        # A list of pairs (class, converter) from Python types to OM
         self._conv_to_om = []
 
+        # a cache mapping Python classes to the converters that apply to
+        # their instances, most recent first, and to their __openmath__
+        # method; rebuilt on registration
+        self._conv_by_class = {}
+
         # a dictionary mapping OM classes to converters
         self._omclass_to_py = {}
 
+        # a cache mapping OM classes to the way they are converted: an
+        # entry of _omclass_to_py, symbol lookup, or _APPLY for applications
+        self._to_python_by_class = {}
+
         # a dictionary to convert OMS elements to Python objects:
         # _oms_to_py((cdbase,cd,name)) = lambda : ...
         # _oms_to_py((cdbase,cd,None)) = lambda name: ...
@@ -100,10 +145,14 @@ class Converter(object):
         # _oms_to_py((None,None,None)) = lambda cdbase,cd,name: ...
         self._oms_to_py = {}
 
+        # a cache of the lookups in _oms_to_py, keyed by (cdbase,cd,name)
+        self._oms_cache = {}
+
     # use this to convert literals or to override the conversion implemented in _oms_to_py
     # any obj of class cls is converted to conv(obj)
     def register_to_python_class(self, cls, conv):
         self._omclass_to_py[cls] = conv
+        self._to_python_by_class.clear()
 
     # registration functions for symbols
     def register_to_python_name(self, base, cd, name, py):
@@ -115,52 +164,116 @@ class Converter(object):
     # unifies the above
     def _register_to_python(self, base, cd, name, py):
         self._oms_to_py[(base,cd,name)] = py
+        self._oms_cache.clear()
 
-    # lookup in _oms_to_py, trying from most to least specific entry
+    # lookup in _oms_to_py, memoizing the resolved entry per symbol
     def _lookup_to_python(self, cdbase, cd, name):
+        key = (cdbase, cd, name)
+        r = self._oms_cache.get(key)
+        if r is None:
+            if len(self._oms_cache) >= self._oms_cache_size:
+                self._oms_cache.clear()
+            r = self._oms_cache[key] = self._resolve_to_python(cdbase, cd, name)
+        conv, args = r
+        return conv(*args)
+
+    # find the entry in _oms_to_py, trying from most to least specific
+    # returns the entry together with the arguments it is called with
+    def _resolve_to_python(self, cdbase, cd, name):
         r = self._oms_to_py.get((cdbase, cd, name))
         if r is not None:
-            return r()
+            return r, ()
         r = self._oms_to_py.get((cdbase, cd, None))
         if r is not None:
-            return r(name)
+            return r, (name,)
         r = self._oms_to_py.get((cdbase, None, None))
         if r is not None:
-            return r(cd,name)
+            return r, (cd, name)
         r = self._oms_to_py.get((None, None, None))
         if r is not None:
-            return r(cdbase,cd,name)
+            return r, (cdbase, cd, name)
         raise ValueError("no entry found for " + cdbase + "?" + cd + "?" + name)
 
 
     def to_python(self, omobj):
         """ Convert OpenMath object to Python """
+        # The tree is walked with an explicit stack of objects to convert.
+        # Converted values are pushed on `results` in post-order; a
+        # _PendingApply(n) on the stack applies the value n+1 positions
+        # from the top of `results` to the n values above it.
+        by_class = self._to_python_by_class
+        results = []
+        todo = [omobj]
+        while todo:
+            omobj = todo.pop()
+            cls = type(omobj)
+            # oma, once its children are converted
+            if cls is _PendingApply:
+                i = len(results) - omobj.n - 1
+                elem = results[i]
+                arguments = results[i+1:]
+                del results[i:]
+                results.append(elem(*arguments))
+                continue
+            conv = by_class.get(cls)
+            if conv is None:
+                conv = by_class[cls] = self._resolve_to_python_class(cls)
+            # oma, convert its children first
+            if conv is _APPLY:
+                attrs = omobj._attrs
+                todo.append(_PendingApply(len(attrs.arguments)))
+                todo.extend(reversed(attrs.arguments))
+                todo.append(attrs.elem)
+            else:
+                results.append(conv(omobj))
+        return results[0]
+
+    def _resolve_to_python_class(self, cls):
+        """ Find how to convert OpenMath objects of class ``cls`` """
         # general overrides
-        if omobj.__class__ in self._omclass_to_py:
-            return self._omclass_to_py[omobj.__class__](omobj)
+        conv = self._omclass_to_py.get(cls)
+        if conv is not None:
+            return conv
         # oms
-        elif isinstance(omobj, om.OMSymbol):
-            return self._lookup_to_python(omobj.cdbase, omobj.cd, omobj.name)
+        elif issubclass(cls, om.OMSymbol):
+            return self._symbol_to_python
         # oma
-        elif isinstance(omobj, om.OMApplication):
-            elem = self.to_python(omobj.elem)
-            arguments = [self.to_python(x) for x in omobj.arguments]
-            return elem(*arguments)
-        raise ValueError('Cannot convert object of class %s to Python.' % omobj.__class__.__name__)
+        elif issubclass(cls, om.OMApplication):
+            return _APPLY
+        raise ValueError('Cannot convert object of class %s to Python.' % cls.__name__)
+
+    def _symbol_to_python(self, omobj):
+        # read the fields once, rather than through OMAny.__getattr__
+        attrs = omobj._attrs
+        return self._lookup_to_python(attrs.cdbase, attrs.cd, attrs.name)
 
     def to_openmath(self, obj):
         """ Convert Python object to OpenMath """
-        for cl, conv in reversed(self._conv_to_om):
-            if cl is None or isinstance(obj, cl):
-                try:
-                    return conv(obj)
-                except CannotConvertError:
-                    continue
-
-        if hasattr(obj, '__openmath__'):
-            return obj.__openmath__()
-
-        raise ValueError('Cannot convert %r to OpenMath.' % obj)
+        convs, openmath = self._converters_to_openmath(type(obj))
+        for conv in convs:
+            try:
+                return conv(obj)
+            except CannotConvertError:
+                continue
+
+        if openmath is not None:
+            return openmath(obj)
+
+        raise ValueError('Cannot convert %r to OpenMath.' % (obj,))
+
+    def _converters_to_openmath(self, cls):
+        """ Cached version of ``_resolve_to_openmath`` """
+        r = self._conv_by_class.get(cls)
+        if r is None:
+            r = self._conv_by_class[cls] = self._resolve_to_openmath(cls)
+        return r
+
+    def _resolve_to_openmath(self, cls):
+        """ Find the converters applying to instances of ``cls``, most recent
+        first, and the ``__openmath__`` method of ``cls`` if any """
+        convs = tuple(conv for cl, conv in reversed(self._conv_to_om)
+                      if issubclass(cls, cl))
+        return convs, getattr(cls, '__openmath__', None)
 
     def register_to_openmath(self, py_class, converter):
         """Register a conversion from Python to OpenMath
@@ -186,11 +299,47 @@ class Converter(object):
         Converters registered by this function are called in order from the
         most recent to the oldest.
         """
-        if py_class is not None and not isclass(py_class):
+        if py_class is not None and not isinstance(py_class, type):
             raise TypeError('Expected class, found %r' % py_class)
         if not callable(converter) and not isinstance(converter, om.OMAny):
             raise TypeError('Expected callable or openmath.OMAny object, found %r' % converter)
+        # converters for all objects are stored as converters for object
+        if py_class is None:
+            py_class = object
+        # OpenMath objects are callable too, wrap them to return themselves
+        if isinstance(converter, om.OMAny):
+            value = converter
+            converter = lambda obj: value
         self._conv_to_om.append((py_class, converter))
+        self._conv_by_class.clear()
+
+    def compile_for_types(self, py_classes):
+        """Return a conversion to OpenMath specialized for some Python classes
+
+        :param py_classes: The classes of the objects that will be converted
+        :type py_classes: Iterable
+
+        :rtype: Callable
+
+        The returned function converts instances of exactly the classes in
+        ``py_classes`` using the converters registered for them at the time
+        of this call, skipping the lookup done by ``to_openmath``. Any other
+        object, or any object that none of those converters accepts, is
+        passed on to ``to_openmath``.
+        """
+        table = {}
+        for cls in py_classes:
+            table[cls] = self._resolve_to_openmath(cls)[0]
+        to_openmath = self.to_openmath
+
+        def specialized(obj):
+            for conv in table.get(type(obj), ()):
+                try:
+                    return conv(obj)
+                except CannotConvertError:
+                    continue
+            return to_openmath(obj)
+        return specialized
 
     # deprecated, made private for now
     def _deprecated_register_to_python(self, cd, name, converter=None):
@@ -228,7 +377,7 @@ class Converter(object):
         is discouraged to use it for ``OMSymbol`` and ``OMApplication``.
         """
         if converter is None:
-            if isclass(cd) and issubclass(cd, om.OMAny):
+            if isinstance(cd, type) and issubclass(cd, om.OMAny):
                 self._conv_to_py[cd] = name
             else:
                 raise TypeError('Two-arguments form expects subclass of openmath.OMAny, found %r' % cd)
@@ -260,10 +409,19 @@ class BasicPythonConverter(Converter):
     - strings,
     - bytes,
     - lists (recursively),
-    - sets (recursively).
+    - sets (recursively),
+    - ranges.
+
+    Ranges with step 1 are converted to integer intervals. Other ranges
+    are converted to lists, provided they have at most
+    ``_range_list_limit`` elements.
     """
+    __slots__ = ()
+
     # base for OM standard CDs
     _omBase = 'http://www.openmath.org/cd'
+    # longest range with step other than 1 converted to a list
+    _range_list_limit = 1000
 
     def __init__(self):
         super(BasicPythonConverter, self).__init__()
@@ -272,56 +430,127 @@ class BasicPythonConverter(Converter):
         # primitive operators
         r = lambda cd,name,py: self.register_to_python_name(self._omBase, cd, name, py)
         r('nums1', 'infinity', float('inf'))
+        r('nums1', 'NaN', float('nan'))
+        r('arith1', 'unary_minus', neg)
         r('logic1', 'true', True)
         r('logic1', 'false', False)
-        r('set1', 'emptyset', set())
+        # a fresh set for each conversion, entries for names are called without arguments
+        self._register_to_python(self._omBase, 'set1', 'emptyset', set)
         r('set1', 'set', lambda *args: set(args))
         r('list1', 'list', lambda *args: list(args))
+        r('interval1', 'integer_interval', lambda a, b: range(a, b + 1))
         r('complex1', 'complex_cartesian', complex) # this does not work if the arguments are not numbers
         # literals
         s = self.register_to_python_class
-        s(om.OMInteger, lambda o: o.integer)
-        s(om.OMFloat,   lambda o: o.double)
-        s(om.OMString,  lambda o: o.string)
-        s(om.OMBytes,   lambda o: o.bytes)
+        s(om.OMInteger, attrgetter('integer'))
+        s(om.OMFloat,   attrgetter('double'))
+        s(om.OMString,  attrgetter('string'))
+        s(om.OMBytes,   attrgetter('bytes'))
 
         # to OpenMath
         t = self.register_to_openmath
         def oms(name, cd):
-            return om.OMSymbol(name=name, cd=cd, cdbase=self._omBase)
+            return _oms(name, cd, self._omBase)
 
-        for int_type in six.integer_types:
-            t(int_type, lambda i: om.OMInteger(i))
-        for string_type in six.string_types:
-            t(string_type, lambda s: om.OMString(s))
-        t(bytes, lambda b: om.OMBytes(b))
+        t(int, _omint)
+        t(str, om.OMString)
+        t(bytes, om.OMBytes)
         # bool should be registered after int: isinstance(True, int) holds!
-        t(bool, lambda b: oms(str(b).lower(), 'logic1'))
+        bools = {True: oms('true', 'logic1'), False: oms('false', 'logic1')}
+        t(bool, bools.__getitem__)
+        infinity, nan = oms('infinity', 'nums1'), oms('NaN', 'nums1')
+        unary_minus = oms('unary_minus', 'arith1')
         def do_float(f):
-            if f == float('inf'):
-                return oms('infinity', 'nums1')
+            if isinf(f):
+                if f > 0:
+                    return infinity
+                return om.OMApplication(unary_minus, [infinity])
+            elif isnan(f):
+                return nan
             else:
                 return om.OMFloat(f)
         t(float, do_float)
-        t(complex, lambda c: om.OMApplication(oms('complex_cartesian', 'complex1'), map(self.to_openmath, [c.real, c.imag])))
-        t(list, lambda l: om.OMApplication(oms('list','list1'), map(self.to_openmath, l)))
+        to_om = self.to_openmath
+        complex_cartesian, list_ = oms('complex_cartesian', 'complex1'), oms('list', 'list1')
+        t(complex, lambda c: om.OMApplication(complex_cartesian, [to_om(c.real), to_om(c.imag)]))
+        def direct_converters():
+            # the converters above for ints and floats, for as long as they
+            # are the ones to_openmath uses: collections call them directly
+            direct = {}
+            for cls, conv in ((int, _omint), (float, do_float)):
+                if self._converters_to_openmath(cls)[0][:1] == (conv,):
+                    direct[cls] = conv
+            return direct
+        def do_list(l):
+            # Nested lists that this function converts too are walked with
+            # an explicit stack of [list, arguments, position] frames,
+            # filling in the arguments of each application in place,
+            # instead of recursing through to_openmath.
+            nested = self._converters_to_openmath(list)[0][:1] == (do_list,)
+            direct = direct_converters()
+            result = om.OMApplication(list_, l)
+            stack = [[l, result.arguments, 0]]
+            active = set([id(l)])
+            while stack:
+                frame = stack[-1]
+                source, arguments, i = frame
+                n = len(arguments)
+                while i < n:
+                    x = arguments[i]
+                    if nested and type(x) is list:
+                        break
+                    arguments[i] = direct.get(type(x), to_om)(x)
+                    i += 1
+                if i == n:
+                    stack.pop()
+                    active.discard(id(source))
+                    continue
+                frame[2] = i + 1
+                if id(x) in active:
+                    raise ValueError('Cannot convert recursive list to OpenMath.')
+                active.add(id(x))
+                arguments[i] = om.OMApplication(list_, x)
+                stack.append([x, arguments[i].arguments, 0])
+            return result
+        t(list, do_list)
+        emptyset, set_ = oms('emptyset', 'set1'), oms('set', 'set1')
         def do_set(s):
-            if s:
-                return om.OMApplication(oms('set', 'set1'), map(self.to_openmath, s))
-            else:
-                return oms('emptyset', cd='set1')
+            if not s:
+                return emptyset
+            direct = direct_converters()
+            return om.OMApplication(set_, [direct.get(type(x), to_om)(x) for x in s])
         t(set, do_set)
-
-
-# A default converter instance for convenience
-DefaultConverter = BasicPythonConverter()
-
-# Shorthands for backward compatibility (and convenience?)
-to_python = DefaultConverter.to_python
-to_openmath = DefaultConverter.to_openmath
+        integer_interval = oms('integer_interval', 'interval1')
+        def do_range(r):
+            if r.step == 1:
+                return om.OMApplication(integer_interval, [to_om(r.start), to_om(r.stop - 1)])
+            if len(r) > self._range_list_limit:
+                raise ValueError('Cannot convert %r to OpenMath: Range with step other than 1 has more than %d elements.'
+                                 % (r, self._range_list_limit))
+            return om.OMApplication(list_, [to_om(x) for x in r])
+        t(range, do_range)
+
+
+# A default converter instance for convenience, with shorthands for
+# backward compatibility (and convenience?). They are created on first
+# access, so that importing this module does not build a converter.
 #register = DefaultConverter.register # not used anymore
-register_to_openmath = DefaultConverter.register_to_openmath
-register_to_python_class = DefaultConverter.register_to_python_class
+_default_shorthands = ('to_python', 'to_openmath',
+                       'register_to_openmath', 'register_to_python_class')
+# so that threads racing on first access share one converter
+_default_lock = threading.Lock()
+
+def __getattr__(name):
+    if name != 'DefaultConverter' and name not in _default_shorthands:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    g = globals()
+    with _default_lock:
+        if 'DefaultConverter' not in g:
+            default = BasicPythonConverter()
+            for shorthand in _default_shorthands:
+                g[shorthand] = getattr(default, shorthand)
+            g['DefaultConverter'] = default
+    return g[name]
 
 class CannotConvertError(RuntimeError):
     """
@@ -329,3 +558,8 @@ class CannotConvertError(RuntimeError):
     to handle the inputs.
     """
     pass
+
+
+# DefaultConverter and the shorthands are created by __getattr__
+__all__ = ["Converter", "BasicPythonConverter", "CannotConvertError",
+           "DefaultConverter"] + list(_default_shorthands)
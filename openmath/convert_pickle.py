@@ -2,8 +2,8 @@
 """
 A generic OpenMath exporter for Python based on the pickle protocol
 
-Note: the current implementation works only with Python 2, due to
-reliance on internals of Python's pickle that have changed in Python 3.
+The pickle is run by Python's own (C accelerated) unpickler; the
+only hook used is :meth:`pickle.Unpickler.find_class`.
 
 EXAMPLES::
 
@@ -110,15 +110,14 @@ Sage objects::
 
 from __future__ import absolute_import
 import importlib
+import io
+import sys
+import threading
+from functools import lru_cache
 
 import openmath.convert
 from openmath import openmath as om
 
-import zlib
-
-import six
-import six.moves
-
 import pickle
 
 ##############################################################################
@@ -132,6 +131,14 @@ class PickleConverter(object):
 
     def __init__(self):
         self._cdbase="http://python.org/"
+        self._symbol = lru_cache(maxsize=4096)(self._make_symbol)
+        self._none = self.OMSymbol('Python', 'none')
+        self._true = self.OMSymbol('Python', 'true')
+        self._false = self.OMSymbol('Python', 'false')
+        self._list = self.OMSymbol('Python', 'list')
+        self._tuple = self.OMSymbol('Python', 'tuple')
+        self._dict = self.OMSymbol('Python', 'dict')
+        self._local = threading.local()
         self._basic_converter = openmath.convert.BasicPythonConverter()
         self._basic_converter.register_to_python_cd(base=self._cdbase, cd="Python", py=lambda name: PickleConverter.importPythonBasics[name])
         self._basic_converter.register_to_python_cdbase(base=self._cdbase, py=load_python_global)
@@ -152,12 +159,46 @@ class PickleConverter(object):
 
 
         if sobj is None:
-            sobj = pickle.dumps(o, protocol=2)
-        file = six.BytesIO(sobj)
-        
+            # the pickler of this thread is reused, unless it is already
+            # dumping, i.e. when a __reduce__ converts another object
+            local = self._local
+            reuse = not getattr(local, 'busy', False)
+            if reuse:
+                try:
+                    buf, buffers, pickler = local.pickler
+                except AttributeError:
+                    buf, buffers, pickler = local.pickler = self._new_pickler()
+                local.busy = True
+            else:
+                buf, buffers, pickler = self._new_pickler()
+            try:
+                pickler.dump(o)
+                buf.seek(0)
+                return OMUnpickler(buf, self, buffers).load()
+            finally:
+                # do not keep o alive through the memo, pickle or buffers
+                pickler.clear_memo()
+                buf.seek(0)
+                buf.truncate()
+                del buffers[:]
+                if reuse:
+                    local.busy = False
+        return OMUnpickler(io.BytesIO(sobj), self).load()
+
+    @staticmethod
+    def _new_pickler():
+        """
+        Return a buffer, a list for out-of-band buffers and a pickler
+        writing to them
 
-            
-        return OMUnpickler(file, self).load()
+        Objects supporting out-of-band pickling (PEP 574) hand over their
+        data as buffers instead of copying it into the pickle.
+        """
+        buf = io.BytesIO()
+        buffers = []
+        pickler = pickle.Pickler(buf, protocol=pickle.HIGHEST_PROTOCOL,
+                                 buffer_callback=buffers.append)
+        return buf, buffers, pickler
    
     ##############################################################################
     # Some new OpenMath constructs
@@ -174,7 +215,16 @@ class PickleConverter(object):
             >>> converter = PickleConverter()
             >>> o = converter.OMSymbol(module="foo.bar", name="baz"); o
             OMSymbol(name='baz', cd='foo.bar', id=None, cdbase='http://python.org/')
+
+        The symbols are cached, as pickles tend to refer to the same
+        globals over and over::
+
+            >>> converter.OMSymbol(module="foo.bar", name="baz") is o
+            True
         """
+        return self._symbol(module, name)
+
+    def _make_symbol(self, module, name):
         return om.OMSymbol(cdbase=self._cdbase, cd=module, name=name)
 
     def OMNone(self):
@@ -189,7 +239,7 @@ class PickleConverter(object):
             OMSymbol(name='none', cd='Python', id=None, cdbase='http://python.org/')
             >>> converter.to_python(o)
         """
-        return self.OMSymbol('Python', name='none')
+        return self._none
 
     def OMBool(self, b):
         r"""
@@ -209,9 +259,9 @@ class PickleConverter(object):
             False
         """
         if b:
-            return self.OMSymbol("Python", "true")
+            return self._true
         else:
-            return self.OMSymbol("Python", "false")
+            return self._false
 
     def OMList(self, l):
         """
@@ -232,7 +282,7 @@ class PickleConverter(object):
         """
         # Except for the conversion of operands, this duplicates the default
         # implementation of python's list conversion to openmath in py_openmath
-        return om.OMApplication(elem=om.OMSymbol(cdbase=self._cdbase, cd='Python', name='list', ), arguments=l)
+        return om.OMApplication(elem=self._list, arguments=l)
 
     def OMTuple(self, l):
         """
@@ -249,8 +299,7 @@ class PickleConverter(object):
             >>> converter.to_python(o)
             (2, 3)
         """
-        return om.OMApplication(elem=self.OMSymbol(module='Python', name='tuple'),
-                                arguments=l)
+        return om.OMApplication(elem=self._tuple, arguments=l)
 
     def OMDict(self, items):
         """
@@ -280,8 +329,11 @@ class PickleConverter(object):
             >>> converter.to_python(o)
             {1: 3, 3: 3}
         """
-        return om.OMApplication(elem=self.OMSymbol(module='Python', name='dict'),
-                                arguments=[self.OMTuple(item) for item in items])
+        OMApplication = om.OMApplication
+        tuple_sym = self._tuple
+        return OMApplication(elem=self._dict,
+                             arguments=[OMApplication(elem=tuple_sym, arguments=item)
+                                        for item in items])
 
 def load_python_global(module, name):
     """
@@ -301,10 +353,13 @@ def load_python_global(module, name):
     """
 
     # The builtin module has been renamed in python3
-    if module == '__builtin__' and six.PY3:
+    if module == '__builtin__':
         module = 'builtins'
-    module = importlib.import_module(module)
-    return getattr(module, name)
+    # Skip the import machinery for modules that are already loaded
+    mod = sys.modules.get(module)
+    if mod is None:
+        mod = importlib.import_module(module)
+    return getattr(mod, name)
 
 
 ##############################################################################
@@ -323,7 +378,7 @@ def tuple_from_sequence(*args):
         >>> tuple([1, 2, 3])
         (1, 2, 3)
     """
-    return tuple(args)
+    return args
 
 def cls_new(cls, *args):
     return cls.__new__(cls, *args)
@@ -364,8 +419,13 @@ def cls_build(inst, state):
         try:
             d = inst.__dict__
             try:
-                for k, v in six.iteritems(state):
-                    d[six.moves.intern(k)] = v
+                # Interning the keys of small states is not worth a
+                # Python level loop: let dict.update do the work in C
+                if type(state) is dict and len(state) < 8:
+                    d.update(state)
+                else:
+                    for k, v in state.items():
+                        d[sys.intern(k)] = v
             # keys in state don't have to be strings
             # don't blow up, but don't go out of our way
             except TypeError:
@@ -392,100 +452,165 @@ def cls_build(inst, state):
 # Unpickler -- turns a pickled object into OpenMath
 ##############################################################################
 
-# check if we have the dispatch attribute on the Unpickler class
-# if not, fall back to the _Unpickler version (python3)
-if hasattr(pickle.Unpickler, 'dispatch'):
-    _Unpickler = pickle.Unpickler
-else:
-    _Unpickler = pickle._Unpickler
+class _Global(type):
+    """
+    Metaclass of the placeholders that stand for Python globals in a pickle
+
+    :meth:`OMUnpickler.find_class` returns such a placeholder instead
+    of importing the global. Calling the placeholder, as done by the
+    REDUCE opcode, and calling its ``__new__``, as done by NEWOBJ,
+    record the call as a :class:`_Reduce` instead of performing it.
+    """
+    def __call__(cls, *args):
+        return _Reduce(cls, args)
+
+def _global_new(cls, *args):
+    return _Reduce(_cls_new, (cls,) + args)
+
+_globals = {}
+
+def _global(module, name):
+    """
+    Return the (cached) placeholder for the global ``module.name``
+    """
+    key = (module, name)
+    placeholder = _globals.get(key)
+    if placeholder is None:
+        placeholder = _globals[key] = _Global(name, (), {
+            '__module__': module, '__qualname__': name, '__new__': _global_new})
+    return placeholder
 
-class OMUnpickler(_Unpickler):
+_cls_new = _global("openmath.convert_pickle", "cls_new")
+
+_no_state = object()
+
+class _Reduce(object):
+    """
+    A call recorded by the unpickler, together with the state set by BUILD
+    """
+    __slots__ = ('func', 'args', 'state')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.state = _no_state
+
+    def __setstate__(self, state):
+        self.state = state
+
+class OMUnpickler(pickle.Unpickler):
     """
     An unpickler that constructs an OpenMath object whose later
     conversion to evaluation will produce the desired Python object.
 
     This can be seen as a lazy unpickler that produces an OpenMath
     object as intermediate step.
+
+    The opcodes are run by the (C accelerated) standard unpickler;
+    globals are replaced by placeholders through :meth:`find_class`,
+    so that the unpickled object graph only records the calls. This
+    graph is then converted to OpenMath by :meth:`finalize`.
     """
-    def __init__(self, file, converter):
-        _Unpickler.__init__(self, file)
+    def __init__(self, file, converter, buffers=None):
+        pickle.Unpickler.__init__(self, file, buffers=buffers)
         self._converter = converter
-    
-    # we need to do this twice to enable stuff
-    dispatch = dict(_Unpickler.dispatch)
-    
-    # Finalization
-    def load_stop(self):
-        value = self.stack.pop()
-        value = self.finalize(value)
-        raise pickle._Stop(value)
-    dispatch[pickle.STOP] = load_stop    # Python 2
-    dispatch[pickle.STOP[0]] = load_stop # Python 3
-
-    def finalize(self, value):
+
+    def find_class(self, module, name):
+        return _global(module, name)
+
+    def load(self):
+        return self.finalize(pickle.Unpickler.load(self))
+
+    def finalize(self, root):
+        """
+        Convert the object graph built by the unpickler to OpenMath
+
+        The graph is walked iteratively, children first, so that deeply
+        nested objects do not hit the recursion limit; objects that are
+        shared in the pickle are converted only once.
+
+        Values of the common scalar types are converted through a table
+        keyed by their exact type, before trying the containers.
+        """
         converter = self._converter
-        if isinstance(value, om.OMApplication):
-            for i in range(len(value.arguments)):
-                value.arguments[i] = self.finalize(value.arguments[i])
-        if isinstance(value, om.OMAny):
-            return value
-        elif isinstance(value, bool):
-            return OMBool(value)
-        elif isinstance(value, list):
-            return converter.OMList([self.finalize(arg) for arg in value])
-        elif isinstance(value, tuple):
-            return converter.OMTuple([self.finalize(arg) for arg in value])
-        elif isinstance(value, dict):
-            return converter.OMDict([(self.finalize(key), self.finalize(v))
-                            for key, v in value.items()])
-        elif isinstance(value, six.string_types):
-            return om.OMString(string=value)
-        elif value is None:
-            return converter.OMNone()
-        else:
-            return converter._basic_converter.to_openmath(value)
-
-    def load_global(self):
-        module = self.readline()[:-1].decode("utf-8")
-        name = self.readline()[:-1].decode("utf-8")
-        #func_name = module+"."+name
-        # Variant: om.OMSymbol(name='func_name', **cd_of(func_name))
-        # where cd_of would return {'cdbase': 'sagemath.org', 'cd': 'sagemath'}
-        #self.append(om.OMApplication(om.OMSymbol(name='load_global', cd='python'),
-        #                             [om.OMString(func_name)]))
-        #def func(*args):
-        #    return om.OMApplication(om.OMSymbol(name='apply_function', cd='python'),
-        #                            (om.OMString(func_name),)+args)
-        #self.append(func)
-        OMSymbol = self._converter.OMSymbol
-        self.append(OMSymbol(module=module, name=name))
-    dispatch[pickle.GLOBAL[0]] = load_global
-
-    def load_reduce(self):
-        stack = self.stack
-        args = stack.pop()
-        func = stack[-1]
-        stack[-1] = om.OMApplication(func, args)
-    dispatch[pickle.REDUCE[0]] = load_reduce
-
-    def load_newobj(self):
-        args = self.stack.pop()
-        cls = self.stack.pop()
-        OMSymbol = self._converter.OMSymbol
-        obj =  om.OMApplication(OMSymbol(module="openmath.convert_pickle", name='cls_new'),
-                                (cls,) + args)
-        self.append(obj)
-    dispatch[pickle.NEWOBJ[0]] = load_newobj
-
-    def load_build(self):
-        stack = self.stack
-        state = stack.pop()
-        inst = stack.pop()
-        OMSymbol = self._converter.OMSymbol
-        obj =  om.OMApplication(OMSymbol(module="openmath.convert_pickle", name='cls_build'),
-                                (inst, state))
-        self.append(obj)
-    dispatch[pickle.BUILD[0]] = load_build
+        basic = converter._basic_converter.to_openmath
+        none = converter.OMNone()
+        bytearray_ = converter.OMSymbol('builtins', 'bytearray')
+
+        def buffer(view):
+            # out-of-band buffers are copied, as they share the memory of
+            # the object being converted; writable ones stay writable
+            data = om.OMBytes(view.tobytes())
+            if view.readonly:
+                return data
+            return om.OMApplication(bytearray_, [data])
+
+        scalars = {int: basic, float: basic, bytes: basic, complex: basic,
+                   str: om.OMString, bool: converter.OMBool,
+                   type(None): lambda value: none,
+                   pickle.PickleBuffer: lambda value: buffer(value.raw()),
+                   memoryview: buffer}
+        done = {}
+        active = set()
+        todo = [(root, False)]
+        while todo:
+            value, ready = todo.pop()
+            key = id(value)
+            if key in done:
+                continue
+            scalar = scalars.get(type(value))
+            if scalar is not None:
+                done[key] = scalar(value)
+                continue
+            if not ready:
+                if key in active:
+                    raise ValueError('Cannot convert recursive object to OpenMath.')
+                if isinstance(value, _Reduce):
+                    children = [value.func]
+                    children.extend(value.args)
+                    if value.state is not _no_state:
+                        children.append(value.state)
+                elif isinstance(value, (list, tuple)) or type(value) in (set, frozenset):
+                    children = value
+                elif isinstance(value, dict):
+                    children = list(value.keys())
+                    children.extend(value.values())
+                else:
+                    children = ()
+                if children:
+                    active.add(key)
+                    todo.append((value, True))
+                    todo.extend((child, False) for child in children)
+                    continue
+            active.discard(key)
+
+            if isinstance(value, _Global):
+                obj = converter.OMSymbol(module=value.__module__, name=value.__qualname__)
+            elif isinstance(value, _Reduce):
+                obj = om.OMApplication(done[id(value.func)],
+                                       [done[id(arg)] for arg in value.args])
+                if value.state is not _no_state:
+                    OMSymbol = converter.OMSymbol
+                    obj = om.OMApplication(OMSymbol(module="openmath.convert_pickle", name='cls_build'),
+                                           [obj, done[id(value.state)]])
+            elif isinstance(value, list):
+                obj = converter.OMList([done[id(arg)] for arg in value])
+            elif isinstance(value, tuple):
+                obj = converter.OMTuple([done[id(arg)] for arg in value])
+            elif isinstance(value, dict):
+                obj = converter.OMDict([(done[id(k)], done[id(v)])
+                                        for k, v in value.items()])
+            elif type(value) in (set, frozenset):
+                # Pickled natively from protocol 4 on
+                obj = om.OMApplication(converter.OMSymbol('builtins', type(value).__name__),
+                                       [converter.OMList([done[id(item)] for item in value])])
+            elif type(value) is bytearray:
+                # Pickled natively from protocol 5 on
+                obj = om.OMApplication(bytearray_, [om.OMBytes(bytes(value))])
+            else:
+                obj = basic(value)
+            done[key] = obj
+        return done[id(root)]
 
 ##############################################################################
 # Shorthands
@@ -495,10 +620,71 @@ pickle_converter=PickleConverter()
 to_openmath = pickle_converter.to_openmath
 to_python = pickle_converter.to_python
 
+class _InflatingReader(io.RawIOBase):
+    """
+    A readable stream over the decompressed content of zlib compressed data
+
+    The data is decompressed on demand, ``chunk_size`` bytes at a time,
+    so that the whole decompressed content is never held in memory.
+    """
+    chunk_size = 32768
+
+    def __init__(self, data):
+        import zlib  # only needed for compressed pickles
+        self._data = memoryview(data)
+        self._pos = 0
+        self._inflate = zlib.decompressobj()
+        # decompressed data not read yet: self._pending[self._offset:]
+        self._pending = memoryview(b'')
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        inflate = self._inflate
+        while self._offset == len(self._pending):
+            if inflate.unconsumed_tail:
+                pending = inflate.decompress(inflate.unconsumed_tail, self.chunk_size)
+            elif self._pos < len(self._data):
+                chunk = self._data[self._pos:self._pos + self.chunk_size]
+                self._pos += self.chunk_size
+                pending = inflate.decompress(chunk, self.chunk_size)
+            else:
+                pending = inflate.flush()
+                if not pending:
+                    return 0
+            self._pending = memoryview(pending)
+            self._offset = 0
+        start = self._offset
+        n = min(len(b), len(self._pending) - start)
+        b[:n] = self._pending[start:start + n]
+        self._offset = start + n
+        return n
+
+_zlib_headers = (b'\x78\x01', b'\x78\x5e', b'\x78\x9c', b'\x78\xda')
+
 def OMloads(str):
-    str = zlib.decompress(str)
-    file = six.BytesIO(str)
-    return OMUnpickler(file).load()
+    """
+    Convert a zlib compressed pickle, like a Sage ``.sobj`` file, to OpenMath
+
+    EXAMPLES::
+
+        >>> import pickle, zlib
+        >>> from openmath.convert_pickle import OMloads, to_python
+        >>> to_python(OMloads(zlib.compress(pickle.dumps({1: [2, 3]}, protocol=2))))
+        {1: [2, 3]}
+
+    Uncompressed pickles are read as is::
+
+        >>> to_python(OMloads(pickle.dumps({1: [2, 3]}, protocol=2)))
+        {1: [2, 3]}
+    """
+    if bytes(str[:2]) in _zlib_headers:
+        file = io.BufferedReader(_InflatingReader(str))
+    else:
+        file = io.BytesIO(str)
+    return OMUnpickler(file, pickle_converter).load()
 
 def test_openmath(l):
     """
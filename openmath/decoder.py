@@ -4,8 +4,10 @@ from lxml import etree
 from pkg_resources import resource_filename
 from . import openmath as om
 from . import xml
-import base64
+import binascii
+import collections
 import io
+import itertools
 
 def decode_bytes(xml, validator=None, snippet=False):
     """ Decodes a stream into an OpenMath object.
@@ -38,17 +40,31 @@ def decode_stream(stream, validator=None, snippet=False):
 
     # TODO: Complete the docstring above
 
-    
-    tree = etree.parse(stream)
     if validator is not None:
+        # validation needs the whole document
+        tree = etree.parse(stream)
         validator.assertValid(tree)
+        root = tree.getroot()
+        events = etree.iterwalk(root, events=("start", "end"))
+        clear = False
+    else:
+        # otherwise the document is decoded while it is parsed, and each
+        # element is freed as soon as it has been decoded
+        events = etree.iterparse(stream, events=("start", "end"))
+        root = next(events)[1]
+        events = itertools.chain([("start", root)], events)
+        clear = True
 
-    root = tree.getroot()
     v = root.get("version")
+    res = _decode_events(events, False, clear)
+    # read the document to its end, so that trailing content or a
+    # truncated document is reported by the parser, before the version
+    collections.deque(events, maxlen=0)
+
     if not snippet and (not v or v != "2.0"):
         raise ValueError("Only OpenMath 2.0 is supported")
 
-    return decode_xml(root)
+    return res
 
 def decode_xml(elem, _in_bind = False):
     """ Decodes an XML element into an OpenMath object.
@@ -63,78 +79,163 @@ def decode_xml(elem, _in_bind = False):
     :rtype: OMAny
     """
 
-    obj = xml.tag_to_object(elem)
-    attrs = {}
-    
-    def a2d(*props):
+    return _decode_events(etree.iterwalk(elem, events=("start", "end")), _in_bind)
+
+def _decode_events(events, _in_bind=False, clear=False):
+    """ Decodes the element whose ``start`` and ``end`` events are ``events``.
+
+    Each element is decoded at its ``end`` event, from its attributes and its
+    already decoded children, so that no recursion is involved. With ``clear``,
+    elements are removed from the tree once decoded.
+    """
+
+    # open elements, as [decoder, common attributes, class, in_bind, children]
+    stack = []
+    # depth within the content of an OMFOREIGN, which is not decoded
+    skip = 0
+    for event, elem in events:
+        if skip:
+            skip += 1 if event == "start" else -1
+            continue
+
+        if event == "start":
+            if stack:
+                decode, _, _, in_bind, _ = stack[-1]
+                if decode is _decode_foreign:
+                    skip = 1
+                    continue
+                in_bind = decode is _decode_bind_variables or \
+                    (in_bind and decode is _decode_attribution_pairs)
+            else:
+                in_bind = _in_bind
+            obj = xml.tag_to_object(elem.tag)
+            try:
+                props, decode = _decoder_cache[obj]
+            except KeyError:
+                props, decode = _decoder_cache[obj] = _resolve_decoder(obj)
+            stack.append([decode, props, obj, in_bind, []])
+            continue
+
+        decode, props, obj, in_bind, children = stack.pop()
+        attrs = {}
         for p in props:
             attrs[p] = elem.get(p)
-    
-    if issubclass(obj, om.CommonAttributes):
-        a2d("id")
-    if issubclass(obj, om.CDBaseAttribute):
-        a2d("cdbase")
+        res = decode(elem, attrs, children, in_bind)
+        if res is None:
+            res = obj(**attrs)
 
-    # Root Object
-    if issubclass(obj, om.OMObject):
-        a2d("version")
-        attrs["omel"] = decode_xml(elem[0])
+        if clear:
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
 
-    # Reference Objects
-    elif issubclass(obj, om.OMReference):
-        a2d("href")
+        if not stack:
+            return res
+        stack[-1][4].append(res)
 
-    # Basic Objects
-    elif issubclass(obj, om.OMInteger):
-        attrs["integer"] = int(elem.text)
-    elif issubclass(obj, om.OMFloat):
-        # TODO: Support Hex
-        attrs["double"] = float(elem.get('dec'))
-    elif issubclass(obj, om.OMString):
-        attrs["string"] = elem.text
-    elif issubclass(obj, om.OMBytes):
-        try:
-            attrs["bytes"] = base64.b64decode(elem.text)
-        except TypeError:
-            attrs["bytes"] = base64.b64decode(bytes(elem.text, "ascii"))
-    elif issubclass(obj, om.OMSymbol):
-        a2d("name", "cd")
-    elif issubclass(obj, om.OMVariable):
-        a2d("name")
+# Decoders for each kind of element, tried in order by _resolve_decoder.
+# Each one fills in ``attrs`` from ``elem`` and its decoded ``children``;
+# it may instead return the finished object when the element does not
+# decode to its own class.
 
-    # Derived Elements
-    elif issubclass(obj, om.OMForeign):
-        attrs["obj"] = elem.text
-        a2d("encoding")
+def _decode_object(elem, attrs, children, _in_bind):
+    attrs["version"] = elem.get("version")
+    attrs["omel"] = children[0]
 
-    # Compound Elements
-    elif issubclass(obj, om.OMApplication):
-        attrs["elem"] = decode_xml(elem[0])
-        attrs["arguments"] = list(map(decode_xml, elem[1:]))
-    elif issubclass(obj, om.OMAttribution):
-        attrs["pairs"] = decode_xml(elem[0])
-        attrs["obj"] = decode_xml(elem[1])
-    elif issubclass(obj, om.OMAttributionPairs):
-        if not _in_bind:
-            attrs["pairs"] = [(decode_xml(k), decode_xml(v)) for k, v in zip(elem[::2], elem[1::2])]
-        else:
-            obj = om.OMAttVar
-            attrs["pairs"] = decode_xml(elem[0], True)
-            attrs["obj"] = decode_xml(elem[1], True)
-    elif issubclass(obj, om.OMBinding):
-        attrs["binder"] = decode_xml(elem[0])
-        attrs["vars"] = decode_xml(elem[1])
-        attrs["obj"] = decode_xml(elem[2])
-    elif issubclass(obj, om.OMBindVariables):
-        attrs["vars"] = list(map(lambda x:decode_xml(x, True), elem[:]))
-    elif issubclass(obj, om.OMError):
-        attrs["name"] = decode_xml(elem[0])
-        attrs["params"] = list(map(decode_xml, elem[1:]))
-        
+def _decode_reference(elem, attrs, children, _in_bind):
+    attrs["href"] = elem.get("href")
+
+def _decode_integer(elem, attrs, children, _in_bind):
+    attrs["integer"] = int(elem.text)
+
+def _decode_float(elem, attrs, children, _in_bind):
+    # TODO: Support Hex
+    attrs["double"] = float(elem.get('dec'))
+
+def _decode_string(elem, attrs, children, _in_bind):
+    attrs["string"] = elem.text
+
+def _decode_bytes(elem, attrs, children, _in_bind):
+    # a2b_base64 reads the ASCII text in place, where b64decode
+    # would first encode it to a bytes copy
+    attrs["bytes"] = binascii.a2b_base64(elem.text or "")
+
+def _decode_symbol(elem, attrs, children, _in_bind):
+    attrs["name"] = elem.get("name")
+    attrs["cd"] = elem.get("cd")
+
+def _decode_variable(elem, attrs, children, _in_bind):
+    attrs["name"] = elem.get("name")
+
+def _decode_foreign(elem, attrs, children, _in_bind):
+    attrs["obj"] = elem.text
+    attrs["encoding"] = elem.get("encoding")
+
+def _decode_application(elem, attrs, children, _in_bind):
+    attrs["elem"] = children[0]
+    attrs["arguments"] = children[1:]
+
+def _decode_attribution(elem, attrs, children, _in_bind):
+    attrs["pairs"] = children[0]
+    attrs["obj"] = children[1]
+
+def _decode_attribution_pairs(elem, attrs, children, _in_bind):
+    if not _in_bind:
+        attrs["pairs"] = list(zip(children[::2], children[1::2]))
     else:
-        raise TypeError("Expected OMAny, found %s." % obj.__name__)
+        attrs["pairs"] = children[0]
+        attrs["obj"] = children[1]
+        return om.OMAttVar(**attrs)
+
+def _decode_binding(elem, attrs, children, _in_bind):
+    attrs["binder"] = children[0]
+    attrs["vars"] = children[1]
+    attrs["obj"] = children[2]
 
-    return obj(**attrs)
+def _decode_bind_variables(elem, attrs, children, _in_bind):
+    attrs["vars"] = children
+
+def _decode_error(elem, attrs, children, _in_bind):
+    attrs["name"] = children[0]
+    attrs["params"] = children[1:]
+
+_decoders = [
+    # Root Object
+    (om.OMObject, _decode_object),
+    # Reference Objects
+    (om.OMReference, _decode_reference),
+    # Basic Objects
+    (om.OMInteger, _decode_integer),
+    (om.OMFloat, _decode_float),
+    (om.OMString, _decode_string),
+    (om.OMBytes, _decode_bytes),
+    (om.OMSymbol, _decode_symbol),
+    (om.OMVariable, _decode_variable),
+    # Derived Elements
+    (om.OMForeign, _decode_foreign),
+    # Compound Elements
+    (om.OMApplication, _decode_application),
+    (om.OMAttribution, _decode_attribution),
+    (om.OMAttributionPairs, _decode_attribution_pairs),
+    (om.OMBinding, _decode_binding),
+    (om.OMBindVariables, _decode_bind_variables),
+    (om.OMError, _decode_error),
+]
+
+# class -> (names of the common attributes, decoder), filled in on demand
+_decoder_cache = {}
+
+def _resolve_decoder(obj):
+    """ Find the common attributes and the decoder for elements of class ``obj``. """
+    props = []
+    if issubclass(obj, om.CommonAttributes):
+        props.append("id")
+    if issubclass(obj, om.CDBaseAttribute):
+        props.append("cdbase")
+    for cls, decode in _decoders:
+        if issubclass(obj, cls):
+            return tuple(props), decode
+    raise TypeError("Expected OMAny, found %s." % obj.__name__)
 
 def decode_xml_binding():
     pass
@@ -1,5 +1,10 @@
 """ Code used to encode an OpenMath object into XML. """
-import base64
+import contextlib
+try:
+    # SIMD accelerated, if installed
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
 
 from lxml import etree
 from lxml.builder import ElementMaker
@@ -11,6 +16,9 @@ from . import xml
 default_E = ElementMaker(namespace=xml.openmath_ns,
                          nsmap={ None: xml.openmath_ns })
 
+# namespace prefix -> element maker, for the prefixes passed to encode_xml
+_element_makers = { None: default_E }
+
 def encode_xml(obj, E=None):
     """ Encodes an OpenMath object as an XML node.
 
@@ -25,83 +33,151 @@ def encode_xml(obj, E=None):
     :rtype: etree._Element
     """
 
-    if E is None:
-        E = default_E
-    elif isinstance(E, str):
-        E = ElementMaker(namespace=xml.openmath_ns,
-                         nsmap={ E: xml.openmath_ns })
+    if E is None or isinstance(E, str):
+        try:
+            E = _element_makers[E]
+        except KeyError:
+            E = _element_makers[E] = ElementMaker(namespace=xml.openmath_ns,
+                                                  nsmap={ E: xml.openmath_ns })
+
+    # The tree is walked with an explicit stack of (object, parent
+    # element) pairs rather than by recursion. Elements are created top
+    # down: the root by E, so that it carries the namespace map, and the
+    # others directly inside their parent with etree.SubElement.
+    root = None
+    stack = [(obj, None)]
+    while stack:
+        obj, parent = stack.pop()
+        tag, attr, text, children = _encode_node(obj)
+        if parent is None:
+            elem = root = E(tag, **attr)
+        else:
+            elem = etree.SubElement(parent, tag, attr)
+        if text is not None:
+            elem.text = text
+        stack.extend((child, elem) for child in reversed(children))
+
+    return root
+
+def _encode_node(obj):
+    """ Returns the tag, the XML attributes and the text of the element encoding
+    ``obj``, and the objects to encode as its children. """
+    try:
+        tag, props, encode = _encoder_cache[type(obj)]
+    except KeyError:
+        tag, props, encode = _encoder_cache[type(obj)] = _resolve_encoder(type(obj))
 
-    name = ""
     attr = {}
-    children = []
+    for p in props:
+        attr[p] = getattr(obj, p)
+    text, children = encode(obj, attr)
+    attr = dict((k,str(v)) for k, v in attr.items() if v is not None)
+    return tag, attr, text, children
 
-    if isinstance(obj, om.CDBaseAttribute) and obj.cdbase is not None:
-        attr["cdbase"] = obj.cdbase
+# Encoders for each kind of object, tried in order by _resolve_encoder.
+# Each one fills in the XML attributes in ``attr`` and returns the text of
+# the element, or None, and the list of objects to encode as its children.
 
-    if isinstance(obj, om.CommonAttributes) and obj.id is not None:
-        attr["id"] = obj.id
+def _encode_object(obj, attr):
+    attr["version"] = obj.version
+    return None, [obj.omel]
 
-    # Wrapper object
-    if isinstance(obj, om.OMObject):
-        children.append(encode_xml(obj.omel, E))
-        attr["version"] = obj.version
+def _encode_reference(obj, attr):
+    attr["href"] = obj.href
+    return None, []
 
-    # Derived Objects
-    elif isinstance(obj, om.OMReference):
-        attr["href"] = obj.href
+def _encode_integer(obj, attr):
+    return str(obj.integer), []
 
-    # Basic Objects
-    elif isinstance(obj, om.OMInteger):
-        children.append(str(obj.integer))
-    elif isinstance(obj, om.OMFloat):
-        attr["dec"] = obj.double
-    elif isinstance(obj, om.OMString):
-        if obj.string is not None:
-            children.append(str(obj.string))
-    elif isinstance(obj, om.OMBytes):
-        children.append(base64.b64encode(obj.bytes).decode('ascii'))
-    elif isinstance(obj, om.OMSymbol):
-        attr["name"] = obj.name
-        attr["cd"] = obj.cd
-    elif isinstance(obj, om.OMVariable):
-        attr["name"] = obj.name
+def _encode_float(obj, attr):
+    attr["dec"] = obj.double
+    return None, []
 
-    # Derived Elements
-    elif isinstance(obj, om.OMForeign):
-        attr["encoding"] = obj.encoding
-        children.append(str(obj.obj))
+def _encode_string(obj, attr):
+    if obj.string is not None:
+        return str(obj.string), []
+    return None, []
 
-    # Compound Elements
-    elif isinstance(obj, om.OMApplication):
-        children = [encode_xml(obj.elem, E)]
-        children.extend(encode_xml(x, E) for x in obj.arguments)
-    elif isinstance(obj, om.OMAttribution):
-        children = [encode_xml(obj.pairs, E), encode_xml(obj.obj, E)]
-
-    elif isinstance(obj, om.OMAttributionPairs):
-        for (k, v) in obj.pairs:
-            children.append(encode_xml(k, E))
-            children.append(encode_xml(v, E))
-
-    elif isinstance(obj, om.OMBinding):
-        children = [
-            encode_xml(obj.binder, E),
-            encode_xml(obj.vars, E),
-            encode_xml(obj.obj, E)
-        ]
-    elif isinstance(obj, om.OMBindVariables):
-        children = [encode_xml(x, E) for x in obj.vars]
-    elif isinstance(obj, om.OMAttVar):
-        children = [encode_xml(obj.pairs, E), encode_xml(obj.obj, E)]
-    elif isinstance(obj, om.OMError):
-        children = [encode_xml(obj.name, E)]
-        children.extend(encode_xml(x, E) for x in obj.params)
-    else:
-        raise TypeError("Expected obj to be of type OMAny, found %s." % obj.__class__.__name__)
+def _encode_bytes(obj, attr):
+    # lxml takes the ASCII bytes as text as they are
+    return b64encode(obj.bytes), []
 
-    attr = dict((k,str(v)) for k, v in attr.items() if v is not None)
+def _encode_symbol(obj, attr):
+    attr["name"] = obj.name
+    attr["cd"] = obj.cd
+    return None, []
+
+def _encode_variable(obj, attr):
+    attr["name"] = obj.name
+    return None, []
+
+def _encode_foreign(obj, attr):
+    attr["encoding"] = obj.encoding
+    return str(obj.obj), []
+
+def _encode_application(obj, attr):
+    return None, [obj.elem] + list(obj.arguments)
+
+def _encode_attribution(obj, attr):
+    return None, [obj.pairs, obj.obj]
+
+def _encode_attribution_pairs(obj, attr):
+    children = []
+    for (k, v) in obj.pairs:
+        children.append(k)
+        children.append(v)
+    return None, children
+
+def _encode_binding(obj, attr):
+    return None, [obj.binder, obj.vars, obj.obj]
+
+def _encode_bind_variables(obj, attr):
+    return None, list(obj.vars)
 
-    return E(xml.object_to_tag(obj), *children, **attr)
+def _encode_att_var(obj, attr):
+    return None, [obj.pairs, obj.obj]
+
+def _encode_error(obj, attr):
+    return None, [obj.name] + list(obj.params)
+
+_encoders = [
+    # Wrapper object
+    (om.OMObject, _encode_object),
+    # Derived Objects
+    (om.OMReference, _encode_reference),
+    # Basic Objects
+    (om.OMInteger, _encode_integer),
+    (om.OMFloat, _encode_float),
+    (om.OMString, _encode_string),
+    (om.OMBytes, _encode_bytes),
+    (om.OMSymbol, _encode_symbol),
+    (om.OMVariable, _encode_variable),
+    # Derived Elements
+    (om.OMForeign, _encode_foreign),
+    # Compound Elements
+    (om.OMApplication, _encode_application),
+    (om.OMAttribution, _encode_attribution),
+    (om.OMAttributionPairs, _encode_attribution_pairs),
+    (om.OMBinding, _encode_binding),
+    (om.OMBindVariables, _encode_bind_variables),
+    (om.OMAttVar, _encode_att_var),
+    (om.OMError, _encode_error),
+]
+
+# class -> (tag, names of the common attributes, encoder), filled in on demand
+_encoder_cache = {}
+
+def _resolve_encoder(cls):
+    """ Find the tag, the common attributes and the encoder for objects of class ``cls``. """
+    for c, encode in _encoders:
+        if issubclass(cls, c):
+            props = []
+            if issubclass(cls, om.CDBaseAttribute):
+                props.append("cdbase")
+            if issubclass(cls, om.CommonAttributes):
+                props.append("id")
+            return xml.class_to_tag(cls), tuple(props), encode
+    raise TypeError("Expected obj to be of type OMAny, found %s." % cls.__name__)
 
 
 def encode_bytes(obj, nsprefix=None):
@@ -116,5 +192,48 @@ def encode_bytes(obj, nsprefix=None):
     node = encode_xml(obj, nsprefix)
     return etree.tostring(node)
 
+def encode_stream(obj, stream, nsprefix=None):
+    """ Encodes an OpenMath element into a stream.
+
+    The XML is written as the object is walked, without building it as a
+    tree first, so that large objects can be written with little memory.
+    Unlike encode_bytes, empty elements are written with an explicit end
+    tag.
+
+    :param obj: Object to encode.
+    :type obj: OMAny
+
+    :param stream: Stream (or file name) to write to.
+    :type stream: Any
+
+    :param nsprefix: Namespace prefix to use for
+        http://www.openmath.org/OpenMath", or None if default namespace.
+    :type nsprefix: str, None
+    """
+
+    with etree.xmlfile(stream) as xf, contextlib.ExitStack() as opened:
+        nsmap = { nsprefix: xml.openmath_ns }
+        # one exit stack per depth, holding the element open at that
+        # depth; on errors, opened closes them innermost first
+        levels = []
+        # (object, depth) to write an object, (exit stack, None) to close
+        # the element of an object once its children are written
+        stack = [(obj, 0)]
+        while stack:
+            obj, depth = stack.pop()
+            if depth is None:
+                obj.close()
+                continue
+
+            tag, attr, text, children = _encode_node(obj)
+            if depth == len(levels):
+                levels.append(opened.enter_context(contextlib.ExitStack()))
+            levels[depth].enter_context(xf.element(tag, attr, nsmap=nsmap))
+            nsmap = None
+            if text is not None:
+                xf.write(text)
+            stack.append((levels[depth], None))
+            stack.extend((child, depth + 1) for child in reversed(children))
+
 __all__ = ["encode_xml"]
 
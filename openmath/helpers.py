@@ -116,7 +116,7 @@ Content Dictionary::
 
 from . import openmath as om
 from .convert import CannotConvertError
-import six
+from functools import lru_cache
 import inspect
 
 class _Helper(object):
@@ -135,6 +135,7 @@ class CDBaseHelper(_Helper):
 
         self._cdhook = cdhook
         self._symbolhook = symbolhook
+        self._cds = {}
     
     def __repr__(self):
         """ returns a unique representation of this object """
@@ -156,7 +157,10 @@ class CDBaseHelper(_Helper):
         """ returns a CDHelper object with the given name and this as the base """
         if self._cdhook is not None:
             return self._cdhook(self._cdbase, name, self._converter, self._symbolhook)
-        return CDHelper(self._cdbase, name, self._converter, self._symbolhook)
+        cd = self._cds.get(name)
+        if cd is None:
+            cd = self._cds[name] = CDHelper(self._cdbase, name, self._converter, self._symbolhook)
+        return cd
     
     def __getitem__(self, name):
         """ same as self.__getattr__ """
@@ -175,6 +179,7 @@ class CDHelper(_Helper):
         self._uri = '%s?%s' % (cdbase, cd)
         self._converter = converter
         self._hook = hook
+        self._symbols = {}
     
     def __repr__(self):
         """ returns a unique representation of this object """
@@ -188,9 +193,13 @@ class CDHelper(_Helper):
         """ returns an OpenMath Symbol with self as the content dictonary and the given name """
         # if we have a hook, return whatever the hook returns instead of the symbol
         if self._hook is not None:
-            return self._hook(name, cd, cdbase, converter)
+            return self._hook(name, self._cd, self._cdbase, self._converter)
         
-        return OMSymbol(name=name, cd=self._cd, cdbase=self._cdbase, converter=self._converter)
+        # symbols are immutable, so the same one is handed out every time
+        symbol = self._symbols.get(name)
+        if symbol is None:
+            symbol = self._symbols[name] = OMSymbol(name=name, cd=self._cd, cdbase=self._cdbase, converter=self._converter)
+        return symbol
     
     def __getitem__(self, name):
         """ same as self.__getattr__ """
@@ -214,12 +223,14 @@ class OMSymbol(om.OMSymbol):
     def __init__(self, converter=None, **kwargs):
         super(OMSymbol, self).__init__(**kwargs)
         self._converter = converter
+        self._om = None
     
     def _convert(self, term):
         return convertAsOpenMath(term, self._converter)
     
     def __call__(self, *args, **kwargs):
-        args = [self._convert(a) for a in args]
+        # OpenMath arguments, the common case when nesting calls, are used as is
+        args = [a if isinstance(a, om.OMAny) else self._convert(a) for a in args]
         return self._toOM().__call__(*args, **kwargs)
     
     def __eq__(self, other):
@@ -229,7 +240,9 @@ class OMSymbol(om.OMSymbol):
             return self._toOM() == other
     
     def _toOM(self):
-        return om.OMSymbol(name=self.name, cd=self.cd, id=self.id, cdbase=self.cdbase)
+        if self._om is None:
+            self._om = om.OMSymbol(name=self.name, cd=self.cd, id=self.id, cdbase=self.cdbase)
+        return self._om
 
 
 lambdaOM = CDBaseHelper("http://www.python.org")["lambda"] # .lambda not allowed because it's a reserved word
@@ -240,15 +253,25 @@ def interpretAsOpenMath(x):
     instead, it is used conveniently building OM objects in DSL embedded in Python
     inparticular, it converts Python functions into OMBinding objects using lambdaOM as the binder"""
     
-    if hasattr(x, "_ishelper") and x._ishelper:
-        # wrapped things in this class -> unwrap
-        return x._toOM()
+    # exact types first, as comparing types is cheaper than the checks below
+    t = type(x)
+    if t is int:
+        return om.OMInteger(x)
+    elif t is float:
+        return om.OMFloat(x)
+    elif t is str:
+        return om.OMString(x)
     
     elif isinstance(x, om.OMAny):
-        # already OM
+        # already OM; checked before the hasattr below, which would go
+        # through OMAny.__getattr__
         return x
     
-    elif isinstance(x, six.integer_types):
+    elif hasattr(x, "_ishelper") and x._ishelper:
+        # wrapped things in this class -> unwrap
+        return x._toOM()
+    
+    elif isinstance(x, int):
         # integers -> OMI
         return om.OMInteger(x)
     
@@ -256,7 +279,7 @@ def interpretAsOpenMath(x):
         # floats -> OMF
         return om.OMFloat(x)
 
-    elif isinstance(x, six.string_types):
+    elif isinstance(x, str):
         # strings -> OMSTR
         return om.OMString(x)
     
@@ -267,25 +290,27 @@ def interpretAsOpenMath(x):
     elif inspect.isfunction(x):
         # function -> OMBIND(lambda,...)
         
-        # get all the parameters of the function
-        paramMap = inspect.signature(x).parameters
-        params = [v for k, v in six.iteritems(paramMap)]
-        
-        # make sure that all of them are positional
-        posArgKinds = [inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD]
-        if not all([p.kind in posArgKinds for p in params]):
-            raise CannotInterpretAsOpenMath("no sequence arguments allowed")
-        
         # call the function with appropriate OMVariables
-        paramsOM = [om.OMVariable(name=p.name) for p in params]
+        paramsOM = [om.OMVariable(name=name) for name in _positionalParameters(x)]
         bodyOM = interpretAsOpenMath(x(*paramsOM))
 
-        return OMBinding(om.OMSymbol(name="lambda", cd="python", cdbase="http://python.org"), paramsOM, bodyOM)
+        return om.OMBinding(om.OMSymbol(name="lambda", cd="python", cdbase="http://python.org"), om.OMBindVariables(paramsOM), bodyOM)
     
     else:
         # fail
         raise CannotInterpretAsOpenMath("unknown kind of object: " + str(x))
 
+_posArgKinds = (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+
+@lru_cache(maxsize=256)
+def _positionalParameters(f):
+    """ returns the names of the parameters of f, which must all be positional;
+    cached, as DSL code tends to interpret the same functions over and over """
+    params = inspect.signature(f).parameters.values()
+    if not all(p.kind in _posArgKinds for p in params):
+        raise CannotInterpretAsOpenMath("no sequence arguments allowed")
+    return tuple(p.name for p in params)
+
 def convertAsOpenMath(term, converter):
     """ Converts a term into OpenMath, using either a converter or the interpretAsOpenMath method """
     
@@ -23,17 +23,29 @@ omtags = {
 
 inv_omtags = dict((v,k) for k,v in omtags.items())
     
+# tag string -> (namespace, local name), for the OpenMath tags only so
+# that unknown tags in the input do not grow it
+_split_tags = dict(('{%s}%s' % (openmath_ns, t), (openmath_ns, t)) for t in omtags)
+_split_tags.update((t, (None, t)) for t in omtags)
+
 def tag_to_object(tag, check_ns=False):
-    q = QName(tag)
-    if check_ns and q.namespace != openmath_ns:
+    split = _split_tags.get(tag) if isinstance(tag, str) else None
+    if split is None:
+        q = QName(tag)
+        split = (q.namespace, q.localname)
+    namespace, localname = split
+    if check_ns and namespace != openmath_ns:
         raise ValueError('Invalid namespace')
-    return omtags[q.localname]
+    return omtags[localname]
 
 def object_to_tag(obj, ns=True):
+    return class_to_tag(obj.__class__, ns)
+
+def class_to_tag(cls, ns=True):
     tpl = '{%(ns)s}%(tag)s' if ns else '%(tag)s'
     # FR: I changed this to allow for other classes that extend an OMXXX class.
     # tag = inv_omtags[obj.__class__]
     for t,c in omtags.items():
-        if isinstance(obj, c):
+        if issubclass(cls, c):
             tag = t
     return tpl % { "ns": openmath_ns, "tag": tag }
@@ -10,10 +10,11 @@ setup(
     classifiers=[
         'Intended Audience :: Science/Research',
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
     keywords='openmath',
     packages=find_packages(),
+    python_requires='>=3.8',
     install_requires=['lxml', 'six'],
 )
@@ -1,4 +1,6 @@
+import math
 import unittest
+import weakref
 from fractions import Fraction
 from openmath.convert import *
 from openmath import openmath as om, convert
@@ -10,11 +12,12 @@ class TestConvert(unittest.TestCase):
         testcases = [
             0, 1, -1, 2**100,
             True, False,
-            0.0, 0.1, -0.1, float('inf'),
+            0.0, 0.1, -0.1, float('inf'), float('-inf'),
             complex(1,0), complex(0,1), complex(0,0), complex(1,1),
             "", "test",
             [], [1,2,3],
             set(), set([1,2,3]),
+            range(0), range(1, 5), range(-3, 3),
         ]
         for obj in testcases:
             conv = DefaultConverter.to_python(DefaultConverter.to_openmath(obj))
@@ -22,6 +25,67 @@ class TestConvert(unittest.TestCase):
             self.assertEqual(obj, conv, "Converting %s" % obj.__class__.__name__)
             self.assertRaises(ValueError, DefaultConverter.to_openmath, {})
 
+    def test_emptyset_not_shared(self):
+        o = DefaultConverter.to_openmath(set())
+        DefaultConverter.to_python(o).add(1)
+        self.assertEqual(DefaultConverter.to_python(o), set())
+
+    def test_nan(self):
+        o = DefaultConverter.to_openmath(float('nan'))
+        self.assertEqual(o, om.OMSymbol('NaN', 'nums1', cdbase=DefaultConverter._omBase))
+        self.assertTrue(math.isnan(DefaultConverter.to_python(o)))
+
+    def test_range_step(self):
+        """ Ranges with a step other than 1 are converted to lists. """
+        r = range(10, 0, -3)
+        self.assertEqual(DefaultConverter.to_python(DefaultConverter.to_openmath(r)), list(r))
+        self.assertRaises(ValueError, DefaultConverter.to_openmath, range(0, 10**6, 2))
+
+    def test_arguments_are_lists(self):
+        """ Converted collections hold their arguments in a list. """
+        for obj in [[1, 2], set([1, 2]), complex(1, 2)]:
+            o = DefaultConverter.to_openmath(obj)
+            self.assertIsInstance(o.arguments, list)
+            self.assertEqual(len(o.arguments), 2)
+            self.assertEqual(o, DefaultConverter.to_openmath(obj))
+
+    def test_deep_to_python(self):
+        """ Deeply nested applications do not exhaust the Python stack. """
+        lst = om.OMSymbol('list', 'list1', cdbase=DefaultConverter._omBase)
+        o = om.OMInteger(1)
+        for _ in range(3000):
+            o = om.OMApplication(lst, [o, om.OMInteger(2)])
+        py = DefaultConverter.to_python(o)
+        for _ in range(3000):
+            self.assertEqual(py[1], 2)
+            py = py[0]
+        self.assertEqual(py, 1)
+
+    def test_weakref(self):
+        """ Converters can be weakly referenced. """
+        converter = BasicPythonConverter()
+        self.assertIs(weakref.ref(converter)(), converter)
+
+    def test_raw_python_argument(self):
+        """ Python values inside an application are not OpenMath objects. """
+        lst = om.OMSymbol('list', 'list1', cdbase=DefaultConverter._omBase)
+        o = om.OMApplication(lst, [1])
+        self.assertRaises(ValueError, DefaultConverter.to_python, o)
+
+    def test_deep_to_openmath(self):
+        """ Deeply nested lists do not exhaust the Python stack. """
+        l = [1]
+        for _ in range(3000):
+            l = [l, 2]
+        py = DefaultConverter.to_python(DefaultConverter.to_openmath(l))
+        for _ in range(3000):
+            self.assertEqual(py[1], 2)
+            py = py[0]
+        self.assertEqual(py, [1])
+        r = [1]
+        r.append(r)
+        self.assertRaises(ValueError, DefaultConverter.to_openmath, r)
+
     def test_register_str(self):
         def str_to_om(str):
             return om.OMString('Hello' + str)
@@ -40,12 +104,41 @@ class TestConvert(unittest.TestCase):
         DefaultConverter.register_to_python_cd('base', 'echo1', echo)
         self.assertEqual(DefaultConverter.to_python(om.OMSymbol(cd='echo1', name='echo',cdbase='base')), 'echo')
 
+    def test_register_sym_after_lookup(self):
+        c = BasicPythonConverter()
+        sym = om.OMSymbol(cd='hello1', name='hello', cdbase='base')
+        c.register_to_python_cd('base', 'hello1', lambda name: name)
+        self.assertEqual(c.to_python(sym), 'hello')
+        c.register_to_python_name('base', 'hello1', 'hello', 'world')
+        self.assertEqual(c.to_python(sym), 'world')
+
     def test_register_skip(self):
         def skip(obj):
             raise CannotConvertError()
         DefaultConverter.register_to_openmath(None, skip)
         self.assertEqual(DefaultConverter.to_openmath(u'hello'), om.OMString('hello'))
 
+    def test_register_after_conversion(self):
+        class MyInt(int):
+            pass
+        c = BasicPythonConverter()
+        self.assertEqual(c.to_openmath(MyInt(2)), om.OMInteger(2))
+        c.register_to_openmath(MyInt, lambda i: om.OMString(str(i)))
+        self.assertEqual(c.to_openmath(MyInt(2)), om.OMString('2'))
+        self.assertEqual(c.to_openmath(2), om.OMInteger(2))
+
+    def test_compile_for_types(self):
+        c = BasicPythonConverter()
+        conv = c.compile_for_types([int, str])
+        for obj in [1, 'a', 2.5, [1, 'b'], True]:
+            self.assertEqual(conv(obj), c.to_openmath(obj))
+        self.assertRaises(ValueError, conv, {})
+
+    def test_register_om_object(self):
+        c = BasicPythonConverter()
+        c.register_to_openmath(type(None), om.OMSymbol('none', 'Python'))
+        self.assertEqual(c.to_openmath(None), om.OMSymbol('none', 'Python'))
+
     def test_underscore(self):
         class test:
             def __openmath__(self):
@@ -56,7 +149,7 @@ class TestConvert(unittest.TestCase):
         omBase = DefaultConverter._omBase
         def to_om_rat(obj):
             return om.OMApplication(om.OMSymbol('rational', cd='nums1', cdbase=omBase),
-                                    map(DefaultConverter.to_openmath, [obj.numerator, obj.denominator]))
+                                    [DefaultConverter.to_openmath(obj.numerator), DefaultConverter.to_openmath(obj.denominator)])
         def to_py_rat(numerator, denominator):
             return Fraction(numerator, denominator)
         DefaultConverter.register_to_openmath(Fraction, to_om_rat)
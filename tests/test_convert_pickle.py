@@ -0,0 +1,67 @@
+import gc
+import pickle
+import unittest
+import weakref
+from openmath import openmath as om
+from openmath.convert_pickle import PickleConverter, to_openmath, to_python
+
+class Buffered(object):
+    """ Pickles its data out-of-band, as numpy arrays do """
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        return Buffered, (pickle.PickleBuffer(self.data),)
+
+class Reentrant(object):
+    """ Converts another object while being pickled """
+    def __reduce__(self):
+        to_openmath(Buffered(b'x'))
+        return list, ()
+
+class TestConvertPickle(unittest.TestCase):
+    def test_reentrant(self):
+        """ A __reduce__ may itself convert objects. """
+        o = to_openmath([Reentrant(), 5, 'abc'])
+        self.assertEqual(to_python(o), [[], 5, 'abc'])
+
+    def test_not_kept_alive(self):
+        """ The converted object is released after the conversion. """
+        converter = PickleConverter()
+        b = Buffered(bytearray(b'abcd'))
+        ref = weakref.ref(b)
+        converter.to_openmath(b)
+        del b
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_out_of_band(self):
+        """ Out-of-band buffers are copied into OMBytes. """
+        converter = PickleConverter()
+        b = Buffered(bytearray(b'abcd'))
+        o = converter.to_openmath(b)
+        self.assertIsInstance(o, om.OMApplication)
+        data = o.arguments[0].arguments[0]
+        self.assertEqual(data, om.OMBytes(b'abcd'))
+        self.assertIs(type(data.bytes), bytes)
+        b.data[0] = ord('Z')
+        self.assertEqual(data.bytes, b'abcd')
+        py = converter.to_python(o)
+        self.assertIsInstance(py, Buffered)
+        self.assertIs(type(py.data), bytearray)
+        self.assertEqual(py.data, bytearray(b'abcd'))
+
+    def test_out_of_band_readonly(self):
+        """ Read-only out-of-band buffers come back as bytes. """
+        converter = PickleConverter()
+        o = converter.to_openmath(Buffered(b'abcd'))
+        self.assertEqual(o.arguments, [om.OMBytes(b'abcd')])
+        self.assertIs(type(converter.to_python(o).data), bytes)
+
+    def test_bytearray(self):
+        """ Bytearrays are converted with their data as bytes. """
+        converter = PickleConverter()
+        o = converter.to_openmath(bytearray(b'abcd'))
+        self.assertEqual(o.arguments, [om.OMBytes(b'abcd')])
+        self.assertIs(type(o.arguments[0].bytes), bytes)
+        self.assertEqual(converter.to_python(o), bytearray(b'abcd'))
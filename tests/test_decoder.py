@@ -12,7 +12,7 @@ class TestDecoder(unittest.TestCase):
         """ Tests the decoder based on an example. """
 
         # try to parse the xml
-        with open(os.path.join(os.path.dirname(__file__), 'example.om')) as f:
+        with open(os.path.join(os.path.dirname(__file__), 'example.om'), 'rb') as f:
             xmlnode = etree.fromstring(f.read())
 
         omnode = decode_xml(xmlnode)
@@ -26,3 +26,25 @@ class TestDecoder(unittest.TestCase):
         self.assertEqual(str, om.OMString('hello world'))
         with self.assertRaises(ValueError):
             decode_bytes(b'<OMSTR>hello world</OMSTR>')
+
+    def test_stream(self):
+        """ Test that streamed documents decode like parsed ones """
+        with open(os.path.join(os.path.dirname(__file__), 'example.om'), 'rb') as f:
+            omnode = decode_bytes(f.read())
+        self.assertEqual(omnode, expected, "Decoding an OpenMath stream")
+
+    def test_foreign(self):
+        """ Test that the content of foreign objects is not decoded """
+        obj = decode_bytes(b'<OMFOREIGN encoding="text/html">hello<b>world</b></OMFOREIGN>', snippet=True)
+        self.assertEqual(obj, om.OMForeign('hello', 'text/html'))
+
+    def test_trailing_content(self):
+        """ Test that content after the root element is rejected """
+        self.assertRaises(etree.XMLSyntaxError, decode_bytes,
+            b'<OMOBJ xmlns="http://www.openmath.org/OpenMath" version="2.0"><OMI>1</OMI></OMOBJ><x/>')
+
+    def test_truncated(self):
+        """ Test that truncated documents are reported by the parser """
+        self.assertRaises(etree.XMLSyntaxError, decode_bytes, b'<OMOBJ')
+        self.assertRaises(etree.XMLSyntaxError, decode_bytes,
+            b'<OMOBJ xmlns="http://www.openmath.org/OpenMath" version="2.0"><OMI>1</OMI>')
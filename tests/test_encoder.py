@@ -1,10 +1,13 @@
 import unittest
+import io
 import os.path
 
 from lxml import etree
 
 from tests.utils import expected
-from openmath.encoder import encode_xml
+from openmath.encoder import encode_xml, encode_stream
+from openmath.decoder import decode_bytes
+from openmath import openmath as om
 
 from tests.utils import elements_equal
 
@@ -13,7 +16,7 @@ class TestEncoder(unittest.TestCase):
     def test_example(self):
         """ Tests the encoder based on an example. """
 
-        with open(os.path.join(os.path.dirname(__file__), 'example.om')) as f:
+        with open(os.path.join(os.path.dirname(__file__), 'example.om'), 'rb') as f:
             xmlnode = etree.fromstring(f.read())
 
         encoded = encode_xml(expected, 'om')
@@ -21,3 +24,31 @@ class TestEncoder(unittest.TestCase):
 
         # and check that they are as expected
         self.assertTrue(elements_equal(encoded, xmlnode), "Encoding an OpenMath object")
+
+    def test_deep(self):
+        """ Test that deeply nested objects do not hit the recursion limit """
+        obj = om.OMInteger(1)
+        for i in range(3000):
+            obj = om.OMApplication(om.OMSymbol('f', 'cd'), [obj])
+
+        encoded = encode_xml(obj)
+        depth = 0
+        while len(encoded):
+            encoded = encoded[-1]
+            depth += 1
+        self.assertEqual(depth, 3000)
+        self.assertEqual(encoded.text, '1')
+
+    def test_stream(self):
+        """ Test that streamed encodings decode back to the object """
+        for nsprefix in (None, 'om'):
+            stream = io.BytesIO()
+            encode_stream(expected, stream, nsprefix)
+            self.assertEqual(decode_bytes(stream.getvalue()), expected)
+
+    def test_stream_error(self):
+        """ Test that errors while streaming close the open elements """
+        obj = om.OMObject(om.OMApplication(om.OMSymbol('plus', 'arith1'), [om.OMInteger(1), 5]))
+        stream = io.BytesIO()
+        self.assertRaises(TypeError, encode_stream, obj, stream)
+        self.assertTrue(stream.getvalue().endswith(b'</OMA></OMOBJ>'))